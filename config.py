@@ -6,6 +6,9 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or "sqlite:///inventory.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # bulk INSERT-ите в транзакциите пакетират до толкова реда на statement
+    SQLALCHEMY_ENGINE_OPTIONS = {"insertmanyvalues_page_size": 1000}
+
     # тук качва снимки на продукти и тн
     UPLOAD_FOLDER = "inventory/static/uploads"
 
@@ -24,11 +27,21 @@ class Config:
 
     IP_HASH_SECRET = os.environ.get("IP_HASH_SECRET") or "warepulse-ip-secret-2026"
 
+    # брой PBKDF2 итерации за password хешовете
+    # по-ниска стойност = по-бърз /users/add и login, по-висока = по-сигурно
+    PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS") or 600000)
+
+    # guard срещу N+1 в листинг страниците (включен само в development)
+    RAISE_ON_LAZY_LOAD = False
+
 
 class DevelopmentConfig(Config):
     """настройки за локална разработка"""
     DEBUG = True
 
+    # хвърля грешка ако листинг заявка предизвика lazy load (N+1 регресия)
+    RAISE_ON_LAZY_LOAD = True
+
 
 class ProductionConfig(Config):
     """настройки за хостинг"""
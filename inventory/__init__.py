@@ -34,7 +34,8 @@ def create_app(config_name="default"):
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # session.get гледа първо identity map-а и не пуска SQL ако е зареден вече
+        return db.session.get(User, int(user_id))
 
     @app.before_request
     def before_request():
@@ -108,6 +109,11 @@ def create_app(config_name="default"):
     app.register_blueprint(reports.bp)
     app.register_blueprint(legal.bp)
 
+    # топлим Jinja cache-а за най-горещите admin страници
+    # така компилацията е веднъж на старт а не на първия request на всеки worker
+    for tpl in ("users.html", "dev_dashboard.html", "dev_user_logins.html"):
+        app.jinja_env.get_template(tpl)
+
     with app.app_context():
         db.create_all()
 
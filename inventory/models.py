@@ -1,7 +1,12 @@
+import sys
+
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import func
 from inventory.extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+
+from inventory.utils.security import hash_password
 
 
 # ====================== USERS ====================== #
@@ -31,6 +36,11 @@ class User(db.Model, UserMixin):
     # по желание за брандинг ако решиш да го ползваш
     company_name = db.Column(db.String(150), nullable=True)
 
+    # org-scoped листинга филтрира по created_by_id и role
+    __table_args__ = (
+        db.Index("ix_user_created_by_role", "created_by_id", "role"),
+    )
+
     # връзки към други таблици
     created_by = db.relationship("User", remote_side=[id], backref="created_users")
     transactions = db.relationship("Transaction", back_populates="user")
@@ -42,9 +52,20 @@ class User(db.Model, UserMixin):
         order_by="desc(LoginEvent.logged_in_at)",
     )
 
+    @property
+    def clean_role(self) -> str:
+        # почистената роля intern-ната, смята се веднъж на инстанция
+        # така сравненията с ROLE_* константите са pointer compare без нов string
+        cached = self.__dict__.get("_clean_role_cache")
+        if cached is not None and cached[0] is self.role:
+            return cached[1]
+        cleaned = sys.intern((self.role or "").strip())
+        self.__dict__["_clean_role_cache"] = (self.role, cleaned)
+        return cleaned
+
     def set_password(self, raw_password: str) -> None:
         # 1 място за логиката на парола за да не се дублира по route-ове
-        self.password = generate_password_hash(raw_password, method="pbkdf2:sha256")
+        self.password = hash_password(raw_password)
         self.password_changed_at = datetime.utcnow()
         self.force_password_change = False
 
@@ -52,6 +73,11 @@ class User(db.Model, UserMixin):
         return check_password_hash(self.password, raw_password)
 
 
+# functional индекс за търсенето по username без значение на големи/малки букви
+db.Index("ix_user_username_lower", func.lower(User.username))
+db.Index("ix_user_email_lower", func.lower(User.email))
+
+
 # ====================== LOGIN HISTORY ====================== #
 class LoginEvent(db.Model):
     __tablename__ = "login_event"
@@ -70,6 +96,11 @@ class LoginEvent(db.Model):
     user = db.relationship("User", back_populates="login_events")
 
 
+# dev страницата лист-ва последните login-и на user
+# с този индекс заявката е range scan без отделен sort
+db.Index("ix_loginevent_user_time", LoginEvent.user_id, LoginEvent.logged_in_at.desc())
+
+
 # ====================== WAREHOUSE ====================== #
 class Warehouse(db.Model):
     __tablename__ = "warehouse"
@@ -96,9 +127,6 @@ class Product(db.Model):
     sku = db.Column(db.String(50), nullable=False)
     category = db.Column(db.String(100))
 
-    # това е legacy поле вече истината е Stock
-    quantity = db.Column(db.Integer, default=0)
-
     default_purchase_price = db.Column(db.Float, default=0.0)
     default_sell_price = db.Column(db.Float, default=0.0)
 
@@ -141,6 +169,11 @@ class Transaction(db.Model):
     warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id"), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
 
+    # проверката при триене на склад филтрира по warehouse_id
+    __table_args__ = (
+        db.Index("ix_txn_wh", "warehouse_id"),
+    )
+
     items = db.relationship("TransactionItem", back_populates="transaction", cascade="all, delete-orphan")
 
     partner = db.relationship("Partner", back_populates="transactions")
@@ -158,7 +191,9 @@ class TransactionItem(db.Model):
 
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
+    # смята се от базата (STORED generated column), не се праща в INSERT payload-а
+    # така няма как ред да влезе с total различен от quantity * unit_price
+    total_price = db.Column(db.Float, db.Computed("quantity * unit_price", persisted=True), nullable=False)
 
     # при Sale това се пълни от FIFO логиката
     cost_used = db.Column(db.Float, nullable=True)
@@ -190,6 +225,76 @@ class Stock(db.Model):
     warehouse = db.relationship("Warehouse", back_populates="stocks")
 
 
+# legacy Product.quantity вече не е колона дето се синхронизира ръчно
+# смята се от Stock с correlated subquery и е deferred
+# зарежда се само ако някой реално го пипне, продажби/покупки не пишат в product реда
+Product.quantity = db.column_property(
+    db.select(func.coalesce(func.sum(Stock.quantity), 0))
+    .where(Stock.product_id == Product.id)
+    .correlate_except(Stock)
+    .scalar_subquery(),
+    deferred=True,
+)
+
+
+# ====================== WAREHOUSE STOCK SUMMARY ====================== #
+class WarehouseStockSummary(db.Model):
+    """
+    Денормализирано summary на наличността по склад.
+
+    поддържа се инкрементално от местата които пипат Stock.quantity
+    за да не агрегираме цялата stock таблица на всяко зареждане на /warehouses
+    """
+    __tablename__ = "warehouse_stock_summary"
+
+    warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id"), primary_key=True)
+
+    total_units = db.Column(db.Integer, default=0, nullable=False)
+    distinct_products = db.Column(db.Integer, default=0, nullable=False)
+
+    warehouse = db.relationship("Warehouse", backref=db.backref("stock_summary", uselist=False))
+
+    @staticmethod
+    def apply_stock_change(warehouse_id: int, before_qty: int, after_qty: int) -> None:
+        # вика се при всяка промяна на Stock.quantity в същата транзакция
+        delta = int(after_qty) - int(before_qty)
+        if delta == 0:
+            return
+
+        # distinct_products брои продукти с quantity > 0
+        # преходът през нулата се вижда от per-product stock реда (той е заключен)
+        was_positive = int(before_qty) > 0
+        now_positive = int(after_qty) > 0
+        distinct_delta = 0
+        if now_positive and not was_positive:
+            distinct_delta = 1
+        elif was_positive and not now_positive:
+            distinct_delta = -1
+
+        # инкрементът е в самия UPDATE (total_units = total_units + delta)
+        # read-modify-write в Python губеше ъпдейти при две паралелни
+        # транзакции върху същия склад с различни продукти
+        table = WarehouseStockSummary.__table__
+        res = db.session.execute(
+            table.update()
+            .where(table.c.warehouse_id == warehouse_id)
+            .values(
+                total_units=table.c.total_units + delta,
+                distinct_products=table.c.distinct_products + distinct_delta,
+            )
+        )
+
+        if res.rowcount == 0:
+            # няма ред за този склад още, тръгваме от нула
+            db.session.execute(
+                table.insert().values(
+                    warehouse_id=warehouse_id,
+                    total_units=delta,
+                    distinct_products=max(distinct_delta, 0),
+                )
+            )
+
+
 # ====================== FIFO PURCHASE LOTS ====================== #
 class PurchaseLot(db.Model):
     __tablename__ = "purchase_lot"
@@ -205,6 +310,17 @@ class PurchaseLot(db.Model):
     received_at = db.Column(db.DateTime, default=datetime.utcnow)
     transaction_item_id = db.Column(db.Integer, db.ForeignKey("transaction_item.id"), nullable=True)
 
+    # FIFO-то винаги търси (product, warehouse) с remaining > 0
+    # подредено по received_at с tie-break по id, индекса покрива и ORDER BY-а
+    __table_args__ = (
+        db.Index(
+            "ix_lot_pid_wh_recv",
+            "product_id", "warehouse_id", "received_at", "id",
+            sqlite_where=db.text("quantity_remaining > 0"),
+            postgresql_where=db.text("quantity_remaining > 0"),
+        ),
+    )
+
     product = db.relationship("Product", backref="purchase_lots")
     transaction_item = db.relationship("TransactionItem", back_populates="purchase_lots")
 
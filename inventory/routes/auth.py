@@ -1,14 +1,14 @@
 import re
 from datetime import datetime
 
-import requests
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 
 from inventory.extensions import db
 from inventory.models import User, LoginEvent
-from inventory.utils.security import hash_ip
+from inventory.utils.geoip_api import country_for_ip
+from inventory.utils.security import hash_ip, hash_password
 from inventory.utils.translations import _
 
 bp = Blueprint("auth", __name__)
@@ -21,31 +21,6 @@ def _client_ip() -> str:
     return request.remote_addr or ""
 
 
-def _ip_to_country(ip: str) -> str:
-    if not ip or ip in ("127.0.0.1", "::1"):
-        return "Localhost"
-
-    try:
-        r = requests.get(
-            f"https://ipapi.co/{ip}/json/",
-            headers={"User-Agent": "WarePulse/1.0"},
-            timeout=3,
-        )
-
-        if r.status_code != 200:
-            return "Unknown"
-
-        data = r.json()
-
-        if isinstance(data, dict) and data.get("error"):
-            return "Unknown"
-
-        return (data.get("country_name") or "Unknown").strip() or "Unknown"
-
-    except Exception:
-        return "Unknown"
-
-
 @bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
@@ -77,7 +52,7 @@ def login():
             ip = _client_ip()
             ip_hash = hash_ip(ip)
             ua = (request.headers.get("User-Agent") or "")[:255]
-            country = _ip_to_country(ip)
+            country = country_for_ip(ip)
 
             user.login_count = (user.login_count or 0) + 1
             user.last_login_at = datetime.utcnow()
@@ -153,7 +128,7 @@ def register_admin():
             flash(_("An account with this email or username already exists."), "danger")
             return render_template("register.html")
 
-        hashed_pw = generate_password_hash(password, method="pbkdf2:sha256")
+        hashed_pw = hash_password(password)
 
         new_admin = User(
             username=username,
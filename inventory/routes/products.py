@@ -7,7 +7,7 @@ from werkzeug.utils import secure_filename
 from sqlalchemy.orm import joinedload
 
 from inventory.extensions import db
-from inventory.models import Product, Warehouse, Stock, TransactionItem
+from inventory.models import Product, Warehouse, Stock, TransactionItem, WarehouseStockSummary
 from inventory.utils.translations import _
 from inventory.utils.permissions import has_permission
 
@@ -133,7 +133,9 @@ def add_product():
     if existing:
         # ако продуктът вече съществува добавям само наличност
         stock = _get_or_create_stock(existing.id, warehouse_id)
-        stock.quantity = (stock.quantity or 0) + max(quantity, 0)
+        qty_before = stock.quantity or 0
+        stock.quantity = qty_before + max(quantity, 0)
+        WarehouseStockSummary.apply_stock_change(warehouse_id, qty_before, stock.quantity)
 
         existing.default_purchase_price = purchase_price
         existing.default_sell_price = sell_price
@@ -142,9 +144,6 @@ def add_product():
         if image_relpath:
             existing.image = image_relpath
 
-        # временна синхронизация на legacy quantity
-        existing.quantity = sum((s.quantity or 0) for s in existing.stocks)
-
         db.session.commit()
         flash(_("Product already exists. Stock was added to the selected warehouse."), "success")
         return redirect(url_for("products.products"))
@@ -163,10 +162,9 @@ def add_product():
     db.session.flush()
 
     stock = _get_or_create_stock(new_product.id, warehouse_id)
-    stock.quantity = (stock.quantity or 0) + max(quantity, 0)
-
-    # временна синхронизация
-    new_product.quantity = sum((s.quantity or 0) for s in new_product.stocks)
+    qty_before = stock.quantity or 0
+    stock.quantity = qty_before + max(quantity, 0)
+    WarehouseStockSummary.apply_stock_change(warehouse_id, qty_before, stock.quantity)
 
     db.session.commit()
     flash(_("Product '%(name)s' added successfully!") % {"name": name}, "success")
@@ -239,7 +237,9 @@ def edit_product(id):
 
             if stock_qty is not None and stock_qty >= 0:
                 stock = _get_or_create_stock(product.id, warehouse_id)
+                qty_before = stock.quantity or 0
                 stock.quantity = stock_qty
+                WarehouseStockSummary.apply_stock_change(warehouse_id, qty_before, stock_qty)
                 product.warehouse_id = warehouse_id  # legacy поле
 
     image_file = request.files.get("image")
@@ -250,9 +250,6 @@ def edit_product(id):
         image_file.save(filepath)
         product.image = f"uploads/{filename}"
 
-    # временна синхронизация
-    product.quantity = sum((s.quantity or 0) for s in product.stocks)
-
     db.session.commit()
     flash(_("Product '%(name)s' updated successfully!") % {"name": product.name}, "success")
     return redirect(url_for("products.products"))
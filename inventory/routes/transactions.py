@@ -76,7 +76,8 @@ def transactions():
                 continue
             items.append({"product_id": pid, "quantity": q, "unit_price": p})
 
-        errors = validate_transaction_form_data(ttype, partner_id, warehouse_id, items)
+        # validator-а връща и типизираните редове, после никой не parse-ва наново
+        errors, items = validate_transaction_form_data(ttype, partner_id, warehouse_id, items)
         if errors:
             for e in errors:
                 flash(e, "danger")
@@ -107,13 +108,8 @@ def transactions():
             return redirect(url_for("transactions.transactions"))
 
         # проверявам всички продукти да са от тази фирма
-        requested_ids = []
-        for row in items:
-            try:
-                requested_ids.append(int(row["product_id"]))
-            except Exception:
-                flash(_("Invalid product."), "danger")
-                return redirect(url_for("transactions.transactions"))
+        # product_id-тата идват вече типизирани от validator-а
+        requested_ids = [row["product_id"] for row in items]
 
         owned_products = (
             Product.query
@@ -1,32 +1,49 @@
 import re
+import sys
 from datetime import datetime
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, g
 from flask_login import login_required, current_user
-from werkzeug.security import generate_password_hash
+from sqlalchemy.orm import load_only, raiseload, selectinload
 
 from inventory.extensions import db
 from inventory.models import User, LoginEvent
 from inventory.utils.translations import _
-from inventory.utils.permissions import has_permission
+from inventory.utils.permissions import has_permission, ROLE_ADMIN_OWNER, ROLE_DEVELOPER
+from inventory.utils.security import hash_password
 
 bp = Blueprint("users", __name__)
 
+# колко user-а показваме на страница в листингите
+_PER_PAGE = 50
+
+
+def _current_role() -> str:
+    # почистената роля, веднъж за request-а
+    # current_user е LocalProxy и всяко викане прави attribute lookup + нов string
+    if "_current_role" not in g:
+        g._current_role = sys.intern((current_user.role or "").strip())
+    return g._current_role
+
 
 def _get_owner_id():
     # това е основната схема за фирмата
     # owner е Admin Owner
     # всички други са вързани към него с created_by_id
-    role = (current_user.role or "").strip()
-    if role == "Developer":
-        return None
-    if role == "Admin / Owner":
-        return current_user.id
-    return current_user.created_by_id
+    # кеширам на g защото някои handler-и го викат повече от веднъж
+    if "_owner_id" not in g:
+        role = _current_role()
+        if role is ROLE_DEVELOPER:
+            g._owner_id = None
+        elif role is ROLE_ADMIN_OWNER:
+            g._owner_id = current_user.id
+        else:
+            g._owner_id = current_user.created_by_id
+    return g._owner_id
 
 
 def _is_org_admin(user: User) -> bool:
-    return (user.role or "").strip() == "Admin / Owner"
+    return user.clean_role is ROLE_ADMIN_OWNER
 
 
 def _is_in_same_org(target: User, owner_id: int) -> bool:
@@ -34,6 +51,50 @@ def _is_in_same_org(target: User, owner_id: int) -> bool:
     return (target.id == owner_id) or (target.created_by_id == owner_id)
 
 
+def _load_target_with_admin_flag(user_id: int, owner_id: int):
+    # взимам target-а и дали фирмата има друг Admin / Owner в една заявка
+    # иначе са 2 отделни round trip-а (get + count)
+    other_admin = (
+        db.session.query(User.id)
+        .filter(
+            (User.id == owner_id) | (User.created_by_id == owner_id),
+            User.role == "Admin / Owner",
+            User.id != user_id,
+        )
+        .exists()
+    )
+    return db.session.query(User, other_admin).filter(User.id == user_id).first()
+
+
+# users.html показва само тези колони
+# няма смисъл да дърпаме password hash-а и login данните за листинга
+_USER_LIST_COLUMNS = (User.id, User.username, User.email, User.role, User.created_by_id)
+
+# dev dashboard-а показва и последния login
+_DEV_LIST_COLUMNS = _USER_LIST_COLUMNS + (
+    User.login_count,
+    User.last_login_ip,
+    User.last_login_country,
+    User.last_login_at,
+)
+
+
+def _listing_options(*opts):
+    # опциите за листинг заявка + N+1 guard в development
+    # ако темплейт пипне relationship който не е eager-load-нат гърми веднага
+    # вместо тихо да добави заявка на ред
+    if current_app.config.get("RAISE_ON_LAZY_LOAD"):
+        return opts + (raiseload("*"),)
+    return opts
+
+
+def _form_field(form, key: str) -> str:
+    # взима и чисти поле от формата
+    # без "or" fallback-а който алокира празен string на всяко викане
+    v = form.get(key)
+    return v.strip() if v else ""
+
+
 def _validate_password_rules(password: str) -> str | None:
     # валидирам паролата със същите правила като register_admin
     if len(password) < 8:
@@ -58,17 +119,23 @@ def users():
 
     q = (request.args.get("q") or "").strip()
     r = (request.args.get("role") or "").strip()
+    page = request.args.get("page", 1, type=int)
 
     # developer вижда всички
-    if (current_user.role or "").strip() == "Developer":
-        query = User.query
+    if _current_role() is ROLE_DEVELOPER:
+        query = User.query.options(*_listing_options(
+            load_only(*_USER_LIST_COLUMNS),
+            # creator-а идва с 1 IN заявка вместо lazy SELECT на ред
+            selectinload(User.created_by).load_only(User.id, User.username),
+        ))
         if q:
             query = query.filter((User.username.ilike(f"%{q}%")) | (User.email.ilike(f"%{q}%")))
         if r:
             query = query.filter(User.role == r)
 
-        users_list = query.order_by(User.id.desc()).all()
-        return render_template("users.html", users=users_list, q=q, f_role=r)
+        # pagination за да не дърпаме цялата таблица наведнъж
+        pagination = query.order_by(User.id.desc()).paginate(page=page, per_page=_PER_PAGE, error_out=False)
+        return render_template("users.html", users=pagination.items, pagination=pagination, q=q, f_role=r)
 
     # нормален режим само хората от фирмата
     owner_id = _get_owner_id()
@@ -76,15 +143,22 @@ def users():
         flash(_("Invalid organization context."), "danger")
         return redirect(url_for("main.index"))
 
-    query = User.query.filter((User.id == owner_id) | (User.created_by_id == owner_id))
+    query = (
+        User.query
+        .options(*_listing_options(
+            load_only(*_USER_LIST_COLUMNS),
+            selectinload(User.created_by).load_only(User.id, User.username),
+        ))
+        .filter((User.id == owner_id) | (User.created_by_id == owner_id))
+    )
 
     if q:
         query = query.filter((User.username.ilike(f"%{q}%")) | (User.email.ilike(f"%{q}%")))
     if r:
         query = query.filter(User.role == r)
 
-    users_list = query.order_by(User.id.asc()).all()
-    return render_template("users.html", users=users_list, q=q, f_role=r)
+    pagination = query.order_by(User.id.asc()).paginate(page=page, per_page=_PER_PAGE, error_out=False)
+    return render_template("users.html", users=pagination.items, pagination=pagination, q=q, f_role=r)
 
 
 @bp.route("/users/add", methods=["POST"])
@@ -93,10 +167,11 @@ def add_user():
     if not has_permission(current_user, "users:create"):
         abort(403)
 
-    username = (request.form.get("username") or "").strip()
-    email = (request.form.get("email") or "").strip().lower()
-    password = request.form.get("password") or ""
-    role = (request.form.get("role") or "").strip()
+    form = request.form
+    username = _form_field(form, "username")
+    email = _form_field(form, "email").lower()
+    password = form.get("password") or ""
+    role = _form_field(form, "role")
 
     # тук нарочно държим само не-admin роли
     allowed_roles = ["Warehouse Manager", "Sales Agent"]
@@ -119,7 +194,7 @@ def add_user():
         return redirect(url_for("users.users"))
 
     # developer без owner контекст не прави users
-    if (current_user.role or "").strip() == "Developer":
+    if _current_role() is ROLE_DEVELOPER:
         flash(_("Developer must create users from an owner context."), "warning")
         return redirect(url_for("users.users"))
 
@@ -128,12 +203,15 @@ def add_user():
         flash(_("Invalid organization context."), "danger")
         return redirect(url_for("users.users"))
 
-    existing = User.query.filter((User.username == username) | (User.email == email)).first()
-    if existing:
+    # EXISTS вместо first() - не ни трябва целия ред само да знаем дали го има
+    taken = db.session.query(
+        User.query.filter((User.username == username) | (User.email == email)).exists()
+    ).scalar()
+    if taken:
         flash(_("Username or Email already exists."), "danger")
         return redirect(url_for("users.users"))
 
-    hashed_pw = generate_password_hash(password, method="pbkdf2:sha256")
+    hashed_pw = hash_password(password)
 
     new_user = User(
         username=username,
@@ -158,60 +236,55 @@ def update_role(id):
     if not has_permission(current_user, "users:update_role"):
         abort(403)
 
-    target = User.query.get_or_404(id)
-
-    # пазим developer акаунтите
-    if (target.role or "").strip() == "Developer" and (current_user.role or "").strip() != "Developer":
-        flash(_("You cannot change a Developer account."), "warning")
+    new_role = _form_field(request.form, "role")
+    if new_role not in ["Admin / Owner", "Warehouse Manager", "Sales Agent"]:
+        flash(_("Invalid role."), "danger")
         return redirect(url_for("users.users"))
 
     # developer може да сменя роли но не на друг developer
-    if (current_user.role or "").strip() == "Developer":
-        if (target.role or "").strip() == "Developer":
+    if _current_role() is ROLE_DEVELOPER:
+        target = db.session.get(User, id)
+        if target is None:
+            abort(404)
+
+        if target.clean_role is ROLE_DEVELOPER:
             flash(_("You cannot change another Developer account."), "warning")
             return redirect(url_for("users.users"))
 
-        new_role = (request.form.get("role") or "").strip()
-        if new_role not in ["Admin / Owner", "Warehouse Manager", "Sales Agent"]:
-            flash(_("Invalid role."), "danger")
+    else:
+        # admin owner може само в неговата фирма
+        owner_id = _get_owner_id()
+        if not owner_id:
+            flash(_("Invalid organization context."), "danger")
             return redirect(url_for("users.users"))
 
-        target.role = new_role
-        db.session.commit()
-        flash(_("Role updated."), "success")
-        return redirect(url_for("users.users"))
-
-    # admin owner може само в неговата фирма
-    owner_id = _get_owner_id()
-    if not owner_id:
-        flash(_("Invalid organization context."), "danger")
-        return redirect(url_for("users.users"))
-
-    if not _is_in_same_org(target, owner_id):
-        flash(_("You can only manage users in your organization."), "danger")
-        return redirect(url_for("users.users"))
+        # да не си смениш сам ролята и да се заключиш
+        # проверката е по id от URL-а така че минава преди да пипаме базата
+        if id == current_user.id and new_role != "Admin / Owner":
+            flash(_("You cannot change your own role."), "warning")
+            return redirect(url_for("users.users"))
 
-    new_role = (request.form.get("role") or "").strip()
-    if new_role not in ["Admin / Owner", "Warehouse Manager", "Sales Agent"]:
-        flash(_("Invalid role."), "danger")
-        return redirect(url_for("users.users"))
+        # target + дали има друг admin идват в една заявка
+        row = _load_target_with_admin_flag(id, owner_id)
+        if row is None:
+            abort(404)
+        target, has_other_admin = row
 
-    # да не си смениш сам ролята и да се заключиш
-    if target.id == current_user.id and new_role != "Admin / Owner":
-        flash(_("You cannot change your own role."), "warning")
-        return redirect(url_for("users.users"))
+        # пазим developer акаунтите
+        if target.clean_role is ROLE_DEVELOPER:
+            flash(_("You cannot change a Developer account."), "warning")
+            return redirect(url_for("users.users"))
 
-    # да не махнеш последния admin на фирмата
-    if _is_org_admin(target) and new_role != "Admin / Owner":
-        admins_count = User.query.filter(
-            ((User.id == owner_id) | (User.created_by_id == owner_id)) &
-            (User.role == "Admin / Owner")
-        ).count()
+        if not _is_in_same_org(target, owner_id):
+            flash(_("You can only manage users in your organization."), "danger")
+            return redirect(url_for("users.users"))
 
-        if admins_count <= 1:
+        # да не махнеш последния admin на фирмата
+        if _is_org_admin(target) and new_role != "Admin / Owner" and not has_other_admin:
             flash(_("You cannot remove the last Admin/Owner for this organization."), "warning")
             return redirect(url_for("users.users"))
 
+    # едно flush+commit за целия request
     target.role = new_role
     db.session.commit()
 
@@ -222,31 +295,36 @@ def update_role(id):
 @bp.route("/dev")
 @login_required
 def developer_dashboard():
-    if (current_user.role or "").strip() != "Developer":
+    if _current_role() is not ROLE_DEVELOPER:
         abort(403)
 
     q = (request.args.get("q") or "").strip()
-    query = User.query
+    page = request.args.get("page", 1, type=int)
+
+    query = User.query.options(*_listing_options(load_only(*_DEV_LIST_COLUMNS)))
     if q:
         query = query.filter((User.username.ilike(f"%{q}%")) | (User.email.ilike(f"%{q}%")))
 
-    users_list = query.order_by(User.id.desc()).all()
-    return render_template("dev_dashboard.html", users=users_list, q=q)
+    pagination = query.order_by(User.id.desc()).paginate(page=page, per_page=_PER_PAGE, error_out=False)
+    return render_template("dev_dashboard.html", users=pagination.items, pagination=pagination, q=q)
 
 
 @bp.route("/dev/delete/<int:id>", methods=["POST"])
 @login_required
 def delete_user_dev(id):
-    if (current_user.role or "").strip() != "Developer":
+    if _current_role() is not ROLE_DEVELOPER:
         abort(403)
 
-    target = User.query.get_or_404(id)
-
-    if target.id == current_user.id:
+    # проверка по id от URL-а преди изобщо да търсим target-а
+    if id == current_user.id:
         flash(_("You cannot delete your own account."), "warning")
         return redirect(url_for("users.developer_dashboard"))
 
-    if (target.role or "").strip() == "Developer":
+    target = db.session.get(User, id)
+    if target is None:
+        abort(404)
+
+    if target.clean_role is ROLE_DEVELOPER:
         flash(_("You cannot delete another Developer account."), "warning")
         return redirect(url_for("users.developer_dashboard"))
 
@@ -259,14 +337,25 @@ def delete_user_dev(id):
 @bp.route("/dev/user/<int:user_id>/logins")
 @login_required
 def dev_user_logins(user_id):
-    if (current_user.role or "").strip() != "Developer":
+    if _current_role() is not ROLE_DEVELOPER:
         abort(403)
 
-    user = User.query.get_or_404(user_id)
+    user = db.session.get(User, user_id)
+    if user is None:
+        abort(404)
 
     # показвам последните 50 логина за debug и сигурност
+    # само колоните които темплейта рендва
     events = (
         LoginEvent.query
+        .options(load_only(
+            LoginEvent.id,
+            LoginEvent.logged_in_at,
+            LoginEvent.ip_address,
+            LoginEvent.country,
+            LoginEvent.user_agent,
+            LoginEvent.success,
+        ))
         .filter_by(user_id=user.id)
         .order_by(LoginEvent.logged_in_at.desc())
         .limit(50)
@@ -282,45 +371,44 @@ def delete_user(id):
     if not has_permission(current_user, "users:delete"):
         abort(403)
 
-    target = User.query.get_or_404(id)
-
-    # не можеш да триеш себе си
-    if target.id == current_user.id:
+    # не можеш да триеш себе си - проверка по id преди да пипаме базата
+    if id == current_user.id:
         flash(_("You cannot delete your own account."), "warning")
         return redirect(url_for("users.users"))
 
     # developer може да трие but not other developers
-    if (current_user.role or "").strip() == "Developer":
-        if (target.role or "").strip() == "Developer":
+    if _current_role() is ROLE_DEVELOPER:
+        target = db.session.get(User, id)
+        if target is None:
+            abort(404)
+
+        if target.clean_role is ROLE_DEVELOPER:
             flash(_("Developer accounts cannot delete each other."), "warning")
             return redirect(url_for("users.users"))
 
-        db.session.delete(target)
-        db.session.commit()
-        flash(_("User deleted."), "success")
-        return redirect(url_for("users.users"))
-
-    # admin owner трие само в неговата фирма
-    owner_id = _get_owner_id()
-    if not owner_id:
-        flash(_("Invalid organization context."), "danger")
-        return redirect(url_for("users.users"))
+    else:
+        # admin owner трие само в неговата фирма
+        owner_id = _get_owner_id()
+        if not owner_id:
+            flash(_("Invalid organization context."), "danger")
+            return redirect(url_for("users.users"))
 
-    if not _is_in_same_org(target, owner_id):
-        flash(_("You can only delete users in your organization."), "danger")
-        return redirect(url_for("users.users"))
+        # target + дали има друг admin идват в една заявка
+        row = _load_target_with_admin_flag(id, owner_id)
+        if row is None:
+            abort(404)
+        target, has_other_admin = row
 
-    # пак пазим да не изчезне последния admin
-    if _is_org_admin(target):
-        admins_count = User.query.filter(
-            ((User.id == owner_id) | (User.created_by_id == owner_id)) &
-            (User.role == "Admin / Owner")
-        ).count()
+        if not _is_in_same_org(target, owner_id):
+            flash(_("You can only delete users in your organization."), "danger")
+            return redirect(url_for("users.users"))
 
-        if admins_count <= 1:
+        # пак пазим да не изчезне последния admin
+        if _is_org_admin(target) and not has_other_admin:
             flash(_("You cannot delete the last Admin/Owner for this organization."), "warning")
             return redirect(url_for("users.users"))
 
+    # едно flush+commit за целия request
     db.session.delete(target)
     db.session.commit()
     flash(_("User deleted."), "success")
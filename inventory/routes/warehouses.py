@@ -1,11 +1,10 @@
 # inventory/routes/warehouses.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, g
 from flask_login import login_required, current_user
-from sqlalchemy import func
-
+from sqlalchemy.orm import load_only, raiseload
 from inventory.extensions import db
-from inventory.models import Warehouse, Stock, Transaction
+from inventory.models import Warehouse, Stock, Transaction, WarehouseStockSummary
 from inventory.utils.translations import _
 from inventory.utils.permissions import has_permission
 
@@ -16,12 +15,16 @@ def _get_owner_id():
     # кой е owner-а на фирмата
     # Admin Owner е owner
     # другите са вързани с created_by_id
-    role = (current_user.role or "").strip()
-    if role == "Developer":
-        return None
-    if role == "Admin / Owner":
-        return current_user.id
-    return current_user.created_by_id
+    # кеширам на g (същия ключ като в users.py) за да не се смята по няколко пъти на заявка
+    if "_owner_id" not in g:
+        role = (current_user.role or "").strip()
+        if role == "Developer":
+            g._owner_id = None
+        elif role == "Admin / Owner":
+            g._owner_id = current_user.id
+        else:
+            g._owner_id = current_user.created_by_id
+    return g._owner_id
 
 
 @bp.route("/warehouses")
@@ -33,32 +36,30 @@ def warehouses():
 
     owner_id = _get_owner_id()
 
-    q = Warehouse.query
+    # шаблонът пипа само id, name и location, няма какво да eager-ваме
+    # raiseload в dev режим гърми ако някой почне да lazy load-ва relationship от списъка
+    options = [load_only(Warehouse.id, Warehouse.name, Warehouse.location)]
+    if current_app.config.get("RAISE_ON_LAZY_LOAD"):
+        options.append(raiseload("*"))
+
+    q = Warehouse.query.options(*options)
     if owner_id is not None:
         q = q.filter(Warehouse.owner_id == owner_id)
 
     warehouses_list = q.order_by(Warehouse.name.asc()).all()
 
-    # бързо summary за таблицата
-    # общо бройки в склада + колко различни продукта има
-    stock_totals_q = (
-        db.session.query(Stock.warehouse_id, func.coalesce(func.sum(Stock.quantity), 0))
-        .join(Warehouse, Stock.warehouse_id == Warehouse.id)
-    )
-    if owner_id is not None:
-        stock_totals_q = stock_totals_q.filter(Warehouse.owner_id == owner_id)
-
-    stock_totals = dict(stock_totals_q.group_by(Stock.warehouse_id).all())
-
-    product_counts_q = (
-        db.session.query(Stock.warehouse_id, func.count(Stock.id))
-        .join(Warehouse, Stock.warehouse_id == Warehouse.id)
-        .filter(Stock.quantity > 0)
-    )
-    if owner_id is not None:
-        product_counts_q = product_counts_q.filter(Warehouse.owner_id == owner_id)
-
-    product_counts = dict(product_counts_q.group_by(Stock.warehouse_id).all())
+    # summary за таблицата идва от поддържаната warehouse_stock_summary
+    # индексиран lookup по PK вместо GROUP BY върху цялата stock таблица
+    stock_totals = {}
+    product_counts = {}
+    wh_ids = [w.id for w in warehouses_list]
+    if wh_ids:
+        summary_rows = WarehouseStockSummary.query.filter(
+            WarehouseStockSummary.warehouse_id.in_(wh_ids)
+        ).all()
+        for srow in summary_rows:
+            stock_totals[srow.warehouse_id] = srow.total_units
+            product_counts[srow.warehouse_id] = srow.distinct_products
 
     return render_template(
         "warehouses.html",
@@ -119,24 +120,31 @@ def delete_warehouse(id):
 
     w = q.first_or_404()
 
-    # ако има наличност не го трия
-    has_stock = (
-        Stock.query
-        .filter(Stock.warehouse_id == w.id)
-        .filter(Stock.quantity > 0)
-        .first()
-        is not None
+    # двете проверки (наличност + транзакции) в една EXISTS заявка
+    # вместо два отделни SELECT ... LIMIT 1 round trip-а
+    has_stock_q = (
+        db.session.query(Stock.id)
+        .filter(Stock.warehouse_id == w.id, Stock.quantity > 0)
+        .exists()
     )
+    has_txn_q = db.session.query(Transaction.id).filter_by(warehouse_id=w.id).exists()
+    has_stock, has_txn = db.session.query(has_stock_q, has_txn_q).one()
+
+    # ако има наличност не го трия
     if has_stock:
         flash(_("Cannot delete a warehouse that has stock. Move or sell the items first."), "warning")
         return redirect(url_for("warehouses.warehouses"))
 
     # ако има транзакции пак не го трия за да не чупя историята
-    has_txn = Transaction.query.filter_by(warehouse_id=w.id).first() is not None
     if has_txn:
         flash(_("Cannot delete a warehouse that has transactions. Keep it for history."), "warning")
         return redirect(url_for("warehouses.warehouses"))
 
+    # чистим и summary реда на склада
+    summary = db.session.get(WarehouseStockSummary, w.id)
+    if summary is not None:
+        db.session.delete(summary)
+
     db.session.delete(w)
     db.session.commit()
 
@@ -3,10 +3,12 @@ from __future__ import annotations
 from datetime import datetime
 from collections import defaultdict
 
+from sqlalchemy import bindparam, case, func, insert, select, update
+
 from inventory.extensions import db
 from inventory.models import (
     Product, Transaction, TransactionItem, PurchaseLot, Stock,
-    StockMovement, LotAllocation
+    StockMovement, LotAllocation, WarehouseStockSummary
 )
 
 
@@ -25,18 +27,45 @@ class TransactionService:
     """
 
     @staticmethod
-    def _get_or_create_stock(product_id: int, warehouse_id: int) -> Stock:
-        # гаранция че имаме Stock ред за продукта в този склад
-        stock = Stock.query.filter_by(product_id=product_id, warehouse_id=warehouse_id).first()
-        if not stock:
-            stock = Stock(product_id=product_id, warehouse_id=warehouse_id, quantity=0)
-            db.session.add(stock)
+    def _prefetch_products_and_stocks(product_ids: set[int], warehouse_id: int) -> tuple[dict, dict]:
+        # всичко което трябва на item loop-а идва с 2 заявки
+        # вместо по една Product + Stock заявка на всеки ред (класическо N+1)
+        products = {
+            p.id: p
+            for p in Product.query.filter(Product.id.in_(product_ids)).all()
+        }
+
+        # stock редовете се заключват с FOR UPDATE (Postgres, SQLite го игнорира)
+        # така две едновременни продажби на същия продукт се нареждат на опашка в базата
+        # и FIFO lot-овете после се четат под тоя лок, не могат да се изядат двойно
+        # order_by дава детерминистичен ред на заключване - без deadlock между транзакции
+        stocks = {
+            s.product_id: s
+            for s in Stock.query
+            .filter(Stock.warehouse_id == warehouse_id, Stock.product_id.in_(product_ids))
+            .order_by(Stock.product_id)
+            .with_for_update()
+            .all()
+        }
+
+        # липсващите Stock редове се създават наведнъж
+        missing = [
+            Stock(product_id=pid, warehouse_id=warehouse_id, quantity=0)
+            for pid in product_ids
+            if pid not in stocks and pid in products
+        ]
+        if missing:
+            db.session.add_all(missing)
             db.session.flush()
-        return stock
+            for stock in missing:
+                stocks[stock.product_id] = stock
+
+        return products, stocks
 
     @staticmethod
-    def _precheck_sale_stock(items: list[dict], warehouse_id: int) -> dict | None:
-        # предварително проверявам цялата продажба наведнъж
+    def _validate_sale_availability(items: list[dict], products: dict, stocks: dict) -> None:
+        # проверявам цялата продажба наведнъж върху вече заредените products/stocks
+        # без нито една допълнителна заявка
         # важно е защото може да има 2 реда за един и същ продукт и иначе ще се мине на части
         requested = defaultdict(int)
 
@@ -45,106 +74,183 @@ class TransactionService:
                 pid = int(row.get("product_id"))
                 qty = int(row.get("quantity", 0))
             except Exception:
-                return {"error": "Invalid product or quantity."}
+                raise TransactionError("Invalid product or quantity.")
 
             if qty <= 0:
-                return {"error": "Quantity must be greater than 0."}
+                raise TransactionError("Quantity must be greater than 0.")
 
             requested[pid] += qty
 
         if not requested:
-            return {"error": "No items provided."}
-
-        product_ids = list(requested.keys())
-
-        products = Product.query.filter(Product.id.in_(product_ids)).all()
-        product_name = {p.id: (p.name or f"#{p.id}") for p in products}
-
-        stock_rows = (
-            Stock.query
-            .filter(Stock.warehouse_id == warehouse_id, Stock.product_id.in_(product_ids))
-            .all()
-        )
-        stock_map = {s.product_id: int(s.quantity or 0) for s in stock_rows}
+            raise TransactionError("No items provided.")
 
         shortages = []
         for pid, req_qty in requested.items():
-            available = stock_map.get(pid, 0)
+            stock = stocks.get(pid)
+            available = int(stock.quantity or 0) if stock is not None else 0
             if req_qty > available:
-                shortages.append((product_name.get(pid, f"#{pid}"), available, req_qty))
+                product = products.get(pid)
+                name = (product.name if product else None) or f"#{pid}"
+                shortages.append((name, available, req_qty))
 
         if shortages:
             lines = [f"{name}: available {avail}, requested {req}" for (name, avail, req) in shortages]
-            return {"error": "Not enough stock for sale:\n" + "\n".join(lines)}
+            raise TransactionError("Not enough stock for sale:\n" + "\n".join(lines))
+
+    @staticmethod
+    def _fetch_sale_lots(requested: dict[int, int], warehouse_id: int) -> dict[int, list[dict]]:
+        # отворените lot-ове за всички продукти от продажбата с една заявка
+        # вместо отделен SELECT на всеки ред от продажбата
+        # взимаме само трите колони които FIFO-то ползва, не цели ORM обекти
+        lots_by_pid: dict[int, list[dict]] = defaultdict(list)
+
+        if not requested:
+            return lots_by_pid
+
+        # running sum по FIFO реда, така дърпаме само lot-овете които реално
+        # ще се изядат, не цялата история за продукти с много стари lot-ове
+        prev_sum = func.coalesce(
+            func.sum(PurchaseLot.quantity_remaining)
+            .over(
+                partition_by=PurchaseLot.product_id,
+                order_by=(PurchaseLot.received_at.asc(), PurchaseLot.id.asc()),
+                rows=(None, -1),
+            ),
+            0,
+        ).label("prev_sum")
+
+        sq = (
+            select(
+                PurchaseLot.id,
+                PurchaseLot.product_id,
+                PurchaseLot.quantity_remaining,
+                PurchaseLot.unit_cost,
+                PurchaseLot.received_at,
+                prev_sum,
+            )
+            .where(
+                PurchaseLot.warehouse_id == warehouse_id,
+                PurchaseLot.product_id.in_(requested),
+                PurchaseLot.quantity_remaining > 0,
+            )
+            .subquery()
+        )
+
+        needed = case(
+            *[(sq.c.product_id == pid, qty) for pid, qty in requested.items()],
+            else_=0,
+        )
 
-        return None
+        sale_lots = db.session.execute(
+            select(sq.c.id, sq.c.product_id, sq.c.quantity_remaining, sq.c.unit_cost)
+            .where(sq.c.prev_sum < needed)
+            .order_by(sq.c.product_id, sq.c.received_at.asc(), sq.c.id.asc())
+        ).all()
+
+        for row in sale_lots:
+            lots_by_pid[row.product_id].append({
+                "id": row.id,
+                "remaining": int(row.quantity_remaining),
+                "unit_cost": float(row.unit_cost or 0.0),
+            })
+
+        return lots_by_pid
+
+    @staticmethod
+    def _fetch_fallback_costs(product_ids: set[int], warehouse_id: int) -> dict[int, float]:
+        # цената на най-новия lot за всеки продукт с една заявка
+        # ползва се само при allow_negative, да няма по един descending SELECT на недостиг
+        rn = func.row_number().over(
+            partition_by=PurchaseLot.product_id,
+            order_by=(PurchaseLot.received_at.desc(), PurchaseLot.id.desc()),
+        ).label("rn")
+
+        sq = (
+            select(PurchaseLot.product_id, PurchaseLot.unit_cost, rn)
+            .where(
+                PurchaseLot.warehouse_id == warehouse_id,
+                PurchaseLot.product_id.in_(product_ids),
+            )
+            .subquery()
+        )
+
+        rows = db.session.execute(
+            select(sq.c.product_id, sq.c.unit_cost).where(sq.c.rn == 1)
+        ).all()
+
+        return {pid: float(cost or 0.0) for pid, cost in rows}
 
     @staticmethod
     def _fifo_consume_with_allocations(
-        *, transaction_item_id: int, product_id: int, warehouse_id: int, qty: int, allow_negative: bool
-    ) -> float:
+        *, product: Product, warehouse_id: int, qty: int, allow_negative: bool,
+        lots: list[dict], lot_updates: dict[int, int], fallback_costs: dict[int, float]
+    ) -> tuple[float, list[dict]]:
         # тук става FIFO реално
         # взимам най старите lot-ове и от всеки взимам колкото трябва
-        # и пиша LotAllocation за отчетност кой lot колко е дал
+        # и връщам allocation редове за отчетност кой lot колко е дал
+        # (transaction_item_id се закача после, след като item-ите имат id)
+        # lots идват преднаредени от _fetch_sale_lots (една заявка за цялата продажба)
+        # 2 реда за същия продукт делят списъка така че remaining-а се вижда верен
+        # новите remaining-и се събират в lot_updates и отиват с един UPDATE накрая
+        # loop-ът е по шепа lot-а (prefetch-а реже до реално нужните)
+        # затова стои на чист Python, само с локални имена без повторни dict lookup-и
         qty_to_consume = int(qty)
         cost_used = 0.0
-
-        lots = (
-            PurchaseLot.query
-            .filter_by(product_id=product_id, warehouse_id=warehouse_id)
-            .filter(PurchaseLot.quantity_remaining > 0)
-            .order_by(PurchaseLot.received_at.asc(), PurchaseLot.id.asc())
-            .all()
-        )
+        allocations: list[dict] = []
+        append_alloc = allocations.append
 
         for lot in lots:
             if qty_to_consume <= 0:
                 break
 
-            take = min(qty_to_consume, int(lot.quantity_remaining))
-            lot.quantity_remaining -= take
+            remaining = lot["remaining"]
+            if remaining <= 0:
+                continue
+
+            take = remaining if remaining < qty_to_consume else qty_to_consume
+            remaining -= take
             qty_to_consume -= take
 
-            unit_cost = float(lot.unit_cost or 0.0)
+            unit_cost = lot["unit_cost"]
             cost_used += take * unit_cost
 
-            db.session.add(LotAllocation(
-                transaction_item_id=transaction_item_id,
-                purchase_lot_id=lot.id,
-                quantity=take,
-                unit_cost=unit_cost,
-            ))
+            lot["remaining"] = remaining
+            lot_updates[lot["id"]] = remaining
+
+            append_alloc({
+                "purchase_lot_id": lot["id"],
+                "quantity": take,
+                "unit_cost": unit_cost,
+            })
 
         # ако lot-овете не стигат
         # allow_negative True значи пак продължаваме и смятаме себестойност по последен lot
         # иначе fallback към default_purchase_price
         if qty_to_consume > 0:
             if allow_negative:
-                last_lot = (
-                    PurchaseLot.query
-                    .filter_by(product_id=product_id, warehouse_id=warehouse_id)
-                    .order_by(PurchaseLot.received_at.desc(), PurchaseLot.id.desc())
-                    .first()
-                )
-                fallback_cost = float(last_lot.unit_cost or 0.0) if last_lot else 0.0
+                # последните lot цени са дръпнати наведнъж в _fetch_fallback_costs
+                fallback_cost = fallback_costs.get(product.id, 0.0)
             else:
-                product = Product.query.get(product_id)
-                fallback_cost = float(product.default_purchase_price or 0.0) if product else 0.0
+                # продуктът е вече зареден от batch prefetch-а, няма нова заявка
+                fallback_cost = float(product.default_purchase_price or 0.0)
 
             cost_used += qty_to_consume * fallback_cost
             qty_to_consume = 0
 
-        return cost_used
+        return cost_used, allocations
 
     @staticmethod
-    def _create_header(ttype: str, partner_id: int, warehouse_id: int, user_id: int, note: str | None) -> Transaction:
+    def _create_header(
+        ttype: str, partner_id: int, warehouse_id: int, user_id: int,
+        note: str | None, now: datetime
+    ) -> Transaction:
         # header-а е една транзакция а item-ите са редовете
         txn = Transaction(
             type=ttype,
             partner_id=partner_id,
             warehouse_id=warehouse_id,
             user_id=user_id,
-            date=datetime.now(),
+            date=now,
             note=note,
             locked=True,
         )
@@ -153,118 +259,152 @@ class TransactionService:
         return txn
 
     @staticmethod
-    def _purchase_item(txn: Transaction, owner_id: int, product_id: int, qty: int, unit_cost: float) -> TransactionItem:
-        product = Product.query.get(product_id)
-        if not product:
-            raise TransactionError("Product not found.")
-
-        qty = int(qty)
-        if qty <= 0:
-            raise TransactionError("Quantity must be greater than 0.")
-
-        unit_cost = float(unit_cost or 0.0)
-        total_price = qty * unit_cost
-
-        item = TransactionItem(
-            transaction_id=txn.id,
-            product_id=product_id,
-            quantity=qty,
-            unit_price=unit_cost,
-            total_price=total_price,
-            cost_used=None,
-            profit=None,
-        )
-        db.session.add(item)
-        db.session.flush()
+    def _purchase_items_bulk(
+        txn: Transaction, owner_id: int, parsed: list[tuple[Product, Stock, int, float]],
+        stock_deltas: dict[int, int], received_at: datetime
+    ) -> list[dict]:
+        # всички редове от покупката отиват с по един multi-row INSERT на таблица
+        # вместо add + flush на всеки ред (N round trip-а стават 3)
+        item_rows = []
+        for product, stock, qty, unit_cost in parsed:
+            item_rows.append(dict(
+                transaction_id=txn.id,
+                product_id=product.id,
+                quantity=qty,
+                unit_price=unit_cost,
+                cost_used=None,
+                profit=None,
+            ))
 
-        stock = TransactionService._get_or_create_stock(product_id=product_id, warehouse_id=txn.warehouse_id)
-        stock.quantity = int(stock.quantity or 0) + qty
-
-        db.session.add(PurchaseLot(
-            product_id=product_id,
-            warehouse_id=txn.warehouse_id,
-            quantity_remaining=qty,
-            unit_cost=unit_cost,
-            received_at=datetime.now(),
-            transaction_item_id=item.id,
-        ))
-
-        db.session.add(StockMovement(
-            owner_id=owner_id,
-            transaction_id=txn.id,
-            transaction_item_id=item.id,
-            product_id=product_id,
-            warehouse_id=txn.warehouse_id,
-            direction="IN",
-            quantity=qty,
-            unit_cost=unit_cost,
-            unit_price=None,
-            created_by_user_id=txn.user_id,
-            note="Purchase",
-        ))
-
-        return item
+            # не пипаме stock.quantity директно, само трупаме делтата
+            # базата после прави инкремента атомарно
+            qty_before = int(stock.quantity or 0) + stock_deltas.get(stock.id, 0)
+            WarehouseStockSummary.apply_stock_change(txn.warehouse_id, qty_before, qty_before + qty)
+            stock_deltas[stock.id] = stock_deltas.get(stock.id, 0) + qty
+
+        # RETURNING връща id-тата в реда на подадените редове
+        item_ids = db.session.execute(
+            insert(TransactionItem).returning(TransactionItem.id, sort_by_parameter_order=True),
+            item_rows,
+        ).scalars().all()
+
+        lot_rows = []
+        movement_rows = []
+        for item_id, (product, stock, qty, unit_cost) in zip(item_ids, parsed):
+            lot_rows.append(dict(
+                product_id=product.id,
+                warehouse_id=txn.warehouse_id,
+                quantity_remaining=qty,
+                unit_cost=unit_cost,
+                received_at=received_at,
+                transaction_item_id=item_id,
+            ))
+            movement_rows.append(dict(
+                owner_id=owner_id,
+                transaction_id=txn.id,
+                transaction_item_id=item_id,
+                product_id=product.id,
+                warehouse_id=txn.warehouse_id,
+                direction="IN",
+                quantity=qty,
+                unit_cost=unit_cost,
+                unit_price=None,
+                created_by_user_id=txn.user_id,
+                note="Purchase",
+            ))
 
-    @staticmethod
-    def _sale_item(
-        txn: Transaction, owner_id: int, product_id: int, qty: int, sell_price: float, allow_negative: bool
-    ) -> TransactionItem:
-        product = Product.query.get(product_id)
-        if not product:
-            raise TransactionError("Product not found.")
-
-        qty = int(qty)
-        if qty <= 0:
-            raise TransactionError("Quantity must be greater than 0.")
-
-        sell_price = float(sell_price or 0.0)
-        total_price = qty * sell_price
-
-        stock = TransactionService._get_or_create_stock(product_id=product_id, warehouse_id=txn.warehouse_id)
-
-        # втори слой защита да не мине продажба без наличност
-        if not allow_negative and int(stock.quantity or 0) < qty:
-            raise TransactionError(f"Not enough stock for {product.name} in this warehouse (available {stock.quantity}).")
-
-        item = TransactionItem(
-            transaction_id=txn.id,
-            product_id=product_id,
-            quantity=qty,
-            unit_price=sell_price,
-            total_price=total_price,
-        )
-        db.session.add(item)
-        db.session.flush()
+        db.session.execute(insert(PurchaseLot), lot_rows)
+        db.session.execute(insert(StockMovement), movement_rows)
 
-        cost_used = TransactionService._fifo_consume_with_allocations(
-            transaction_item_id=item.id,
-            product_id=product_id,
-            warehouse_id=txn.warehouse_id,
-            qty=qty,
-            allow_negative=allow_negative,
-        )
+        for item_id, row in zip(item_ids, item_rows):
+            row["id"] = item_id
 
-        stock.quantity = int(stock.quantity or 0) - qty
+        return item_rows
 
-        item.cost_used = cost_used
-        item.profit = total_price - cost_used
+    @staticmethod
+    def _sale_items_bulk(
+        txn: Transaction, owner_id: int, parsed: list[tuple[Product, Stock, int, float]],
+        allow_negative: bool, lots_by_pid: dict[int, list[dict]],
+        lot_updates: dict[int, int], stock_deltas: dict[int, int],
+        fallback_costs: dict[int, float]
+    ) -> list[dict]:
+        # FIFO-то и цената се смятат първо в паметта
+        # после item-ите влизат с един multi-row INSERT с готови cost_used/profit
+        # (няма UPDATE след INSERT както беше с ORM обектите)
+        item_rows = []
+        per_item_allocations: list[list[dict]] = []
+
+        for product, stock, qty, sell_price in parsed:
+            # втори слой защита да не мине продажба без наличност
+            # наличността се гледа през натрупаната делта (може да има 2 реда за продукт)
+            available = int(stock.quantity or 0) + stock_deltas.get(stock.id, 0)
+            if not allow_negative and available < qty:
+                raise TransactionError(
+                    f"Not enough stock for {product.name} in this warehouse (available {available})."
+                )
 
-        avg_cost = (cost_used / qty) if qty else None
-        db.session.add(StockMovement(
-            owner_id=owner_id,
-            transaction_id=txn.id,
-            transaction_item_id=item.id,
-            product_id=product_id,
-            warehouse_id=txn.warehouse_id,
-            direction="OUT",
-            quantity=qty,
-            unit_cost=avg_cost,
-            unit_price=sell_price,
-            created_by_user_id=txn.user_id,
-            note="Sale",
-        ))
+            cost_used, allocations = TransactionService._fifo_consume_with_allocations(
+                product=product,
+                warehouse_id=txn.warehouse_id,
+                qty=qty,
+                allow_negative=allow_negative,
+                lots=lots_by_pid.get(product.id, []),
+                lot_updates=lot_updates,
+                fallback_costs=fallback_costs,
+            )
+
+            WarehouseStockSummary.apply_stock_change(txn.warehouse_id, available, available - qty)
+            stock_deltas[stock.id] = stock_deltas.get(stock.id, 0) - qty
+
+            # total_price е generated column, базата си го смята
+            total_price = qty * sell_price
+            item_rows.append(dict(
+                transaction_id=txn.id,
+                product_id=product.id,
+                quantity=qty,
+                unit_price=sell_price,
+                cost_used=cost_used,
+                profit=total_price - cost_used,
+            ))
+            per_item_allocations.append(allocations)
+
+        item_ids = db.session.execute(
+            insert(TransactionItem).returning(TransactionItem.id, sort_by_parameter_order=True),
+            item_rows,
+        ).scalars().all()
+
+        # движенията и allocation-ите отиват с по един executemany INSERT
+        movement_rows = []
+        allocation_rows = []
+        for item_id, row, allocations, (product, stock, qty, sell_price) in zip(
+            item_ids, item_rows, per_item_allocations, parsed
+        ):
+            row["id"] = item_id
+
+            for alloc in allocations:
+                alloc["transaction_item_id"] = item_id
+                allocation_rows.append(alloc)
+
+            avg_cost = (row["cost_used"] / qty) if qty else None
+            movement_rows.append(dict(
+                owner_id=owner_id,
+                transaction_id=txn.id,
+                transaction_item_id=item_id,
+                product_id=product.id,
+                warehouse_id=txn.warehouse_id,
+                direction="OUT",
+                quantity=qty,
+                unit_cost=avg_cost,
+                unit_price=sell_price,
+                created_by_user_id=txn.user_id,
+                note="Sale",
+            ))
+
+        if allocation_rows:
+            db.session.execute(insert(LotAllocation), allocation_rows)
+        db.session.execute(insert(StockMovement), movement_rows)
 
-        return item
+        return item_rows
 
     @staticmethod
     def create_transaction(
@@ -275,19 +415,52 @@ class TransactionService:
         if ttype not in {"Purchase", "Sale"}:
             return {"error": "Invalid transaction type."}
 
-        if ttype == "Sale" and not allow_negative:
-            pre = TransactionService._precheck_sale_stock(items, int(warehouse_id))
-            if pre and pre.get("error"):
-                return {"error": pre["error"]}
-
-        created_items: list[TransactionItem] = []
+        created_items: list = []
 
         try:
-            
+            # продуктите и stock редовете за всички items идват с 2 заявки
+            product_ids = {int(row.get("product_id")) for row in items}
+            products, stocks = TransactionService._prefetch_products_and_stocks(
+                product_ids, int(warehouse_id)
+            )
+
+            # валидацията минава по prefetch-натите dict-ове, без отделен precheck round trip
+            if ttype == "Sale" and not allow_negative:
+                TransactionService._validate_sale_availability(items, products, stocks)
+
+            # за продажба зареждаме отворените lot-ове на всички продукти с една заявка
+            # FIFO consume-а после работи само в паметта
+            lots_by_pid: dict[int, list[dict]] = {}
+            lot_updates: dict[int, int] = {}
+            fallback_costs: dict[int, float] = {}
+            if ttype == "Sale":
+                requested_qty: dict[int, int] = defaultdict(int)
+                for row in items:
+                    requested_qty[int(row.get("product_id"))] += int(row.get("quantity", 0))
+
+                lots_by_pid = TransactionService._fetch_sale_lots(
+                    requested_qty, int(warehouse_id)
+                )
+
+                # при allow_negative може да потрябва цената на последния lot
+                # дърпаме я за всички продукти наведнъж, не при всеки недостиг
+                if allow_negative:
+                    fallback_costs = TransactionService._fetch_fallback_costs(
+                        product_ids, int(warehouse_id)
+                    )
+
+            # едно време на транзакция
+            # header-а и всички lot-ове получават същия timestamp
+            # така FIFO редът вътре в транзакцията е детерминистичен (tie-break по id)
+            now = datetime.now()
+
             txn = TransactionService._create_header(
-                ttype, partner_id, warehouse_id, user_id, note
+                ttype, partner_id, warehouse_id, user_id, note, now
             )
 
+            purchase_rows: list[tuple[Product, Stock, int, float]] = []
+            sale_rows: list[tuple[Product, Stock, int, float]] = []
+
             for row in items:
                 pid = int(row.get("product_id"))
                 qty = int(row.get("quantity", 0))
@@ -296,16 +469,52 @@ class TransactionService:
                 if qty <= 0:
                     raise TransactionError("Quantity must be greater than 0.")
 
+                product = products.get(pid)
+                if not product:
+                    raise TransactionError("Product not found.")
+                stock = stocks[pid]
+
+                # само събираме редовете, писането става наведнъж след loop-а
                 if ttype == "Purchase":
-                    created_items.append(
-                        TransactionService._purchase_item(txn, owner_id, pid, qty, unit_price)
-                    )
+                    purchase_rows.append((product, stock, qty, unit_price))
                 else:
-                    created_items.append(
-                        TransactionService._sale_item(
-                            txn, owner_id, pid, qty, unit_price, allow_negative
-                        )
-                    )
+                    sale_rows.append((product, stock, qty, unit_price))
+
+            stock_deltas: dict[int, int] = {}
+
+            if purchase_rows:
+                created_items = TransactionService._purchase_items_bulk(
+                    txn, owner_id, purchase_rows, stock_deltas, now
+                )
+
+            if sale_rows:
+                created_items = TransactionService._sale_items_bulk(
+                    txn, owner_id, sale_rows, allow_negative, lots_by_pid,
+                    lot_updates, stock_deltas, fallback_costs
+                )
+
+            # наличностите се пипат с един атомарен UPDATE quantity = quantity + delta
+            # базата прави аритметиката, няма read-modify-write на реда
+            stock_payload = [
+                {"b_id": stock_id, "b_delta": delta}
+                for stock_id, delta in stock_deltas.items() if delta
+            ]
+            if stock_payload:
+                db.session.execute(
+                    Stock.__table__.update()
+                    .where(Stock.__table__.c.id == bindparam("b_id"))
+                    .values(quantity=Stock.__table__.c.quantity + bindparam("b_delta")),
+                    stock_payload,
+                )
+
+            # всички изядени lot-ове се ъпдейтват с един executemany UPDATE по PK
+            # вместо по един UPDATE на lot от unit of work-а
+            if lot_updates:
+                db.session.execute(
+                    update(PurchaseLot),
+                    [{"id": lot_id, "quantity_remaining": remaining}
+                     for lot_id, remaining in lot_updates.items()],
+                )
 
             
             db.session.commit()
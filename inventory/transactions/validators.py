@@ -1,5 +1,13 @@
 def validate_transaction_form_data(ttype, partner_id, warehouse_id, items):
+    """
+    Минава веднъж през редовете, връща (errors, cleaned_items).
+
+    cleaned_items са с готови типове {product_id: int, quantity: int, unit_price: float}
+    така downstream кода (route-а и service-а) не parse-ва същите стойности втори път
+    """
     errors = []
+    cleaned_items = []
+
     if not ttype:
         errors.append("Transaction type required.")
     if not partner_id:
@@ -8,17 +16,35 @@ def validate_transaction_form_data(ttype, partner_id, warehouse_id, items):
         errors.append("Warehouse required.")
     if not items or len(items) == 0:
         errors.append("At least one product is required.")
+
     for idx, row in enumerate(items, start=1):
+        row_ok = True
+
+        try:
+            pid = int(row.get('product_id'))
+        except Exception:
+            errors.append(f"Row {idx}: invalid product.")
+            row_ok = False
+
         try:
             qty = int(row.get('quantity', 0))
             if qty <= 0:
                 errors.append(f"Row {idx}: quantity must be > 0.")
+                row_ok = False
         except Exception:
             errors.append(f"Row {idx}: invalid quantity.")
+            row_ok = False
+
         try:
             price = float(row.get('unit_price', 0.0))
             if price < 0:
                 errors.append(f"Row {idx}: unit price cannot be negative.")
+                row_ok = False
         except Exception:
             errors.append(f"Row {idx}: invalid unit price.")
-    return errors
+            row_ok = False
+
+        if row_ok:
+            cleaned_items.append({"product_id": pid, "quantity": qty, "unit_price": price})
+
+    return errors, cleaned_items
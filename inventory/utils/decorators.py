@@ -8,10 +8,13 @@ from inventory.utils.translations import _
 
 def roles_required(*roles):
     """Simple role-based access (kept for backward compatibility)."""
+    # frozenset още при декорирането - проверката е O(1) вместо обхождане на tuple
+    role_set = frozenset(roles)
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if (not current_user.is_authenticated) or (current_user.role not in roles):
+            if (not current_user.is_authenticated) or (current_user.role not in role_set):
                 abort(403)
             return f(*args, **kwargs)
         return decorated_function
@@ -24,13 +27,16 @@ def permission_required(permission: str, *, abort_on_fail: bool = False, redirec
     - abort_on_fail=True -> abort(403)
     - otherwise flash + redirect
     """
+    # локално име при декорирането, спестява global lookup на всяко викане
+    check = has_permission
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
                 abort(403)
 
-            if not has_permission(current_user, permission):
+            if not check(current_user, permission):
                 if abort_on_fail:
                     abort(403)
                 flash(_("You do not have permission to perform this action."), "danger")
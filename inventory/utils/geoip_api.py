@@ -1,15 +1,50 @@
 # inventory/utils/geoip_api.py
 import requests
 
-def country_for_ip(ip: str) -> str | None:
+# споделена сесия с keep-alive, да не се прави нов TCP+TLS handshake на всяка справка
+_session = requests.Session()
+
+# успешните отговори се помнят на ниво процес, IP-тата на login-ващите се повтарят
+# неуспешните не се кешират за да може временна грешка да се оправи при следващ опит
+_cache: dict[str, str] = {}
+_CACHE_MAX = 10000
+
+
+def country_for_ip(ip: str) -> str:
+    # връща име на държава ("Bulgaria"), както се пази в login events
+    # при грешка връща "Unknown" без да го кешира
     if not ip or ip in ("127.0.0.1", "::1"):
         return "Localhost"
 
+    cached = _cache.get(ip)
+    if cached is not None:
+        return cached
+
     try:
-        r = requests.get(f"https://ipapi.co/{ip}/json/", timeout=2)
+        r = _session.get(
+            f"https://ipapi.co/{ip}/json/",
+            headers={"User-Agent": "WarePulse/1.0"},
+            timeout=3,
+        )
+
         if r.status_code != 200:
-            return None
+            return "Unknown"
+
         data = r.json()
-        return data.get("country_code")  # e.g. "BG"
+
+        if not isinstance(data, dict) or data.get("error"):
+            return "Unknown"
+
+        country = (data.get("country_name") or "").strip()
+
     except Exception:
-        return None
+        return "Unknown"
+
+    if not country:
+        return "Unknown"
+
+    if len(_cache) >= _CACHE_MAX:
+        _cache.clear()
+    _cache[ip] = country
+
+    return country
@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import sys
+from functools import lru_cache
+
+from flask import g, has_request_context
+
 
 # стандартни имена на ролите които ползвам навсякъде в проекта
-ROLE_DEVELOPER = "Developer"
-ROLE_ADMIN_OWNER = "Admin / Owner"
-ROLE_WAREHOUSE = "Warehouse Manager"
-ROLE_SALES = "Sales Agent"
+# intern-нати са за да може горещите сравнения да са pointer compare
+ROLE_DEVELOPER = sys.intern("Developer")
+ROLE_ADMIN_OWNER = sys.intern("Admin / Owner")
+ROLE_WAREHOUSE = sys.intern("Warehouse Manager")
+ROLE_SALES = sys.intern("Sales Agent")
 
 
+@lru_cache(maxsize=64)
 def _norm_role(role: str | None) -> str:
     """
     Нормализирам ролята за да няма проблеми
     примерно Admin/Owner vs Admin / Owner vs с излишни интервали
+
+    ролите в базата са шепа стойности така че lru_cache ги помни всичките
+    и strip/split-а се прави по веднъж на процес а не на всяка проверка
     """
     if not role:
         return ""
@@ -29,16 +39,16 @@ def _norm_role(role: str | None) -> str:
 
 # тук описвам кой какви права има
 # форматът е "module:action"
-ROLE_PERMISSIONS: dict[str, set[str]] = {
-    ROLE_DEVELOPER: {
+ROLE_PERMISSIONS: dict[str, frozenset[str]] = {
+    ROLE_DEVELOPER: frozenset({
         # developer има достъп основно до user management
         "users:view",
         "users:delete",
         "users:update_role",
         # нарочно няма settings:manage
-    },
+    }),
 
-    ROLE_ADMIN_OWNER: {
+    ROLE_ADMIN_OWNER: frozenset({
         # users
         "users:view",
         "users:create",
@@ -74,9 +84,9 @@ ROLE_PERMISSIONS: dict[str, set[str]] = {
 
         # reports
         "reports:view",
-    },
+    }),
 
-    ROLE_WAREHOUSE: {
+    ROLE_WAREHOUSE: frozenset({
         # складов служител
         "products:view",
         "products:create",
@@ -88,24 +98,55 @@ ROLE_PERMISSIONS: dict[str, set[str]] = {
         "transactions:view",
         "transactions:create",
         "transactions:create_purchase",
-    },
+    }),
 
-    ROLE_SALES: {
+    ROLE_SALES: frozenset({
         # търговец
         "products:view",
 
         "transactions:view",
         "transactions:create",
         "transactions:create_sale",
-    },
+    }),
+}
+
+# битова маска върху ROLE_PERMISSIONS: всяко право получава стабилен бит
+# проверката става един AND вместо hash + сравнение на дълъг низ
+# самият ROLE_PERMISSIONS остава за четимост и debug
+_PERM_BITS: dict[str, int] = {
+    name: 1 << i
+    for i, name in enumerate(sorted(set().union(*ROLE_PERMISSIONS.values())))
+}
+
+_ROLE_MASK: dict[str, int] = {
+    role: sum(_PERM_BITS[p] for p in perms)
+    for role, perms in ROLE_PERMISSIONS.items()
 }
 
 
+def _check(role: str, permission: str) -> bool:
+    return bool(_ROLE_MASK.get(role, 0) & _PERM_BITS.get(permission, 0))
+
+
 def has_permission(user, permission: str) -> bool:
     """
     Проверявам дали даден user има конкретно право
     например settings:manage или products:create
+
+    резултатът се помни на flask.g за заявката
+    страници които проверяват по няколко права не нормализират ролята всеки път
     """
-    role = _norm_role(getattr(user, "role", None))
-    allowed = ROLE_PERMISSIONS.get(role, set())
-    return permission in allowed
+    if not has_request_context():
+        return _check(_norm_role(getattr(user, "role", None)), permission)
+
+    cache = getattr(g, "_perm_cache", None)
+    if cache is None:
+        cache = g._perm_cache = {}
+
+    key = (getattr(user, "id", None), permission)
+    cached = cache.get(key)
+    if cached is None:
+        role = _norm_role(getattr(user, "role", None))
+        cached = cache[key] = _check(role, permission)
+
+    return cached
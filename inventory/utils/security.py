@@ -2,6 +2,16 @@ import hashlib
 import hmac
 
 from flask import current_app
+from werkzeug.security import generate_password_hash
+
+
+def hash_password(raw_password: str) -> str:
+    # PBKDF2 с настройваем брой итерации
+    # default-а на Werkzeug блокира worker-а за десетки ms на всяко създаване на user
+    # PBKDF2_ITERATIONS в config-а се тунингова спрямо latency бюджета на сървъра
+    iterations = current_app.config.get("PBKDF2_ITERATIONS")
+    method = f"pbkdf2:sha256:{int(iterations)}" if iterations else "pbkdf2:sha256"
+    return generate_password_hash(raw_password, method=method)
 
 
 def hash_ip(ip: str) -> str:
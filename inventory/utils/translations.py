@@ -3,10 +3,17 @@ import json
 from flask import session, request, g
 
 
+# кеш на ниво процес: path -> (mtime, речник с преводите)
+# всеки език се чете и parse-ва по веднъж, не на всяка заявка
+_TRANSLATION_CACHE: dict[str, tuple[float, dict]] = {}
+
+
 def load_translations(lang, app):
     """
     Зареждам JSON файла за съответния език.
     Ако езикът не съществува, падам обратно към DEFAULT_LANG.
+
+    Файлът се помни в кеш по mtime, диска се пипа само при промяна.
     """
     path = os.path.join('translations', f'{lang}.json')
 
@@ -14,8 +21,16 @@ def load_translations(lang, app):
     if not os.path.exists(path):
         path = os.path.join('translations', f"{app.config['DEFAULT_LANG']}.json")
 
+    mtime = os.path.getmtime(path)
+    cached = _TRANSLATION_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
     with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        data = json.load(f)
+
+    _TRANSLATION_CACHE[path] = (mtime, data)
+    return data
 
 
 def set_language(app):
@@ -34,6 +49,8 @@ def set_language(app):
 
     g.lang = session['lang']
     g.translations = load_translations(g.lang, app)
+    # bound метода се закача директно, _() после не минава през g.translations.get
+    g.trans_get = g.translations.get
 
 
 def _(key):
@@ -41,8 +58,9 @@ def _(key):
     Малка helper функция за превод.
     Ако няма превод за даден ключ връщам самия ключ.
     Така никога не чупя страницата.
+
+    Вика се за всеки низ във всеки template така че пътят е максимално кратък:
+    един getattr с default вместо try/except и двойно търсене в g.
     """
-    try:
-        return g.translations.get(key, key)
-    except Exception:
-        return key
+    fn = getattr(g, "trans_get", None)
+    return fn(key, key) if fn is not None else key
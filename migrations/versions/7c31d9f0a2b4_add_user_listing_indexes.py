@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "7c31d9f0a2b4"
+down_revision = "45b0e7c7a8d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_user_created_by_role", "user", ["created_by_id", "role"])
+    op.create_index("ix_user_username_lower", "user", [sa.text("lower(username)")])
+    op.create_index("ix_user_email_lower", "user", [sa.text("lower(email)")])
+
+
+def downgrade():
+    op.drop_index("ix_user_email_lower", table_name="user")
+    op.drop_index("ix_user_username_lower", table_name="user")
+    op.drop_index("ix_user_created_by_role", table_name="user")
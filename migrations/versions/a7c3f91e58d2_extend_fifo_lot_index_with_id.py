@@ -0,0 +1,32 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "a7c3f91e58d2"
+down_revision = "f4b06e8d21c3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # добавям id в ключа за да покрие индекса и ORDER BY received_at, id
+    # без допълнителен sort в плана
+    op.drop_index("ix_lot_pid_wh_recv", table_name="purchase_lot")
+    op.create_index(
+        "ix_lot_pid_wh_recv",
+        "purchase_lot",
+        ["product_id", "warehouse_id", "received_at", "id"],
+        sqlite_where=sa.text("quantity_remaining > 0"),
+        postgresql_where=sa.text("quantity_remaining > 0"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_lot_pid_wh_recv", table_name="purchase_lot")
+    op.create_index(
+        "ix_lot_pid_wh_recv",
+        "purchase_lot",
+        ["product_id", "warehouse_id", "received_at"],
+        sqlite_where=sa.text("quantity_remaining > 0"),
+        postgresql_where=sa.text("quantity_remaining > 0"),
+    )
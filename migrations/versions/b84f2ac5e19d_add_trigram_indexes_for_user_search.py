@@ -0,0 +1,29 @@
+from alembic import op
+
+
+revision = "b84f2ac5e19d"
+down_revision = "7c31d9f0a2b4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # leading-wildcard ILIKE не може да ползва B-tree индекс
+    # на Postgres pg_trgm + GIN позволява на planner-а да ползва индекс за %q%
+    # на SQLite няма еквивалент и търсенето си остава scan (таблицата е малка там)
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute('CREATE INDEX ix_user_username_trgm ON "user" USING gin (username gin_trgm_ops)')
+    op.execute('CREATE INDEX ix_user_email_trgm ON "user" USING gin (email gin_trgm_ops)')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    op.execute("DROP INDEX IF EXISTS ix_user_email_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_user_username_trgm")
@@ -0,0 +1,31 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "b9d14a6e07f5"
+down_revision = "a7c3f91e58d2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # total_price става STORED generated column (quantity * unit_price)
+    # batch режимът пресъздава таблицата така че работи и на SQLite
+    with op.batch_alter_table("transaction_item") as batch_op:
+        batch_op.drop_column("total_price")
+        batch_op.add_column(
+            sa.Column(
+                "total_price",
+                sa.Float(),
+                sa.Computed("quantity * unit_price", persisted=True),
+                nullable=False,
+            )
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("transaction_item") as batch_op:
+        batch_op.drop_column("total_price")
+        batch_op.add_column(sa.Column("total_price", sa.Float(), nullable=True))
+
+    op.execute("UPDATE transaction_item SET total_price = quantity * unit_price")
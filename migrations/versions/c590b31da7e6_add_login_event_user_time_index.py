@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "c590b31da7e6"
+down_revision = "b84f2ac5e19d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_loginevent_user_time",
+        "login_event",
+        ["user_id", sa.text("logged_in_at DESC")],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_loginevent_user_time", table_name="login_event")
@@ -0,0 +1,38 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "d1e84c29f5a7"
+down_revision = "c590b31da7e6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вика db.create_all() при boot, така че на съществуваща база
+    # таблицата може вече да е създадена (но празна) преди да мине миграцията
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("warehouse_stock_summary"):
+        op.create_table(
+            "warehouse_stock_summary",
+            sa.Column("warehouse_id", sa.Integer(), nullable=False),
+            sa.Column("total_units", sa.Integer(), nullable=False, server_default=sa.text("0")),
+            sa.Column("distinct_products", sa.Integer(), nullable=False, server_default=sa.text("0")),
+            sa.ForeignKeyConstraint(["warehouse_id"], ["warehouse.id"]),
+            sa.PrimaryKeyConstraint("warehouse_id"),
+        )
+
+    # backfill от текущите stock редове за да не тръгне summary-то от нула
+    # преизчислява се от нулата (delete + insert) за да е идемпотентно
+    # и да напълни таблицата дори когато create_all я е оставил празна
+    op.execute("DELETE FROM warehouse_stock_summary")
+    op.execute(
+        "INSERT INTO warehouse_stock_summary (warehouse_id, total_units, distinct_products) "
+        "SELECT warehouse_id, COALESCE(SUM(quantity), 0), "
+        "SUM(CASE WHEN quantity > 0 THEN 1 ELSE 0 END) "
+        "FROM stock GROUP BY warehouse_id"
+    )
+
+
+def downgrade():
+    op.drop_table("warehouse_stock_summary")
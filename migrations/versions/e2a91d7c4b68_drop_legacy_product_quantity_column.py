@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "e2a91d7c4b68"
+down_revision = "d1e84c29f5a7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # product.quantity вече се смята от stock (column_property в модела)
+    # колоната и ръчната синхронизация отпадат
+    with op.batch_alter_table("product") as batch_op:
+        batch_op.drop_column("quantity")
+
+
+def downgrade():
+    with op.batch_alter_table("product") as batch_op:
+        batch_op.add_column(sa.Column("quantity", sa.Integer(), nullable=True))
+
+    # backfill от stock за да не остане колоната празна
+    op.execute(
+        "UPDATE product SET quantity = ("
+        "SELECT COALESCE(SUM(s.quantity), 0) FROM stock s WHERE s.product_id = product.id"
+        ")"
+    )
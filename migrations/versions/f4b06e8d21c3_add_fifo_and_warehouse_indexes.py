@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "f4b06e8d21c3"
+down_revision = "e2a91d7c4b68"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # partial индекс за FIFO заявката (product, warehouse, received_at) при remaining > 0
+    op.create_index(
+        "ix_lot_pid_wh_recv",
+        "purchase_lot",
+        ["product_id", "warehouse_id", "received_at"],
+        sqlite_where=sa.text("quantity_remaining > 0"),
+        postgresql_where=sa.text("quantity_remaining > 0"),
+    )
+
+    # delete_warehouse проверява за транзакции по warehouse_id
+    op.create_index("ix_txn_wh", "transaction", ["warehouse_id"])
+
+
+def downgrade():
+    op.drop_index("ix_txn_wh", table_name="transaction")
+    op.drop_index("ix_lot_pid_wh_recv", table_name="purchase_lot")
@@ -1,9 +1,11 @@
 import os, re, json
+from concurrent.futures import ProcessPoolExecutor
 
 ROOT = "."  # ако проекта ти е в друга папка смени
 OUT = "translations/keys_found.json"
 
 # хваща _("text") и _('text')
+# compile-ната е веднъж на ниво модул, worker процесите я наследяват
 PATTERN = re.compile(r"""_\(\s*(['"])(.*?)\1\s*\)""", re.DOTALL)
 
 def iter_files(root):
@@ -15,23 +17,40 @@ def iter_files(root):
             if fn.endswith((".py", ".html", ".jinja", ".j2")):
                 yield os.path.join(dirpath, fn)
 
-keys = set()
-
-for path in iter_files(ROOT):
+def scan(path):
+    # вика се в отделен процес, връща ключовете от един файл
     try:
         with open(path, "r", encoding="utf-8") as f:
             txt = f.read()
-        for _, k in PATTERN.findall(txt):
-            k = " ".join(k.split())  # маха странни whitespace
-            if k:
-                keys.add(k)
     except Exception:
-        pass
+        return []
+
+    # бърз literal filter преди regex-а, повечето файлове нямат _( изобщо
+    if "_(" not in txt:
+        return []
+
+    found = []
+    for _, k in PATTERN.findall(txt):
+        k = " ".join(k.split())  # маха странни whitespace
+        if k:
+            found.append(k)
+    return found
+
+def main():
+    keys = set()
+
+    # файловете са независими, scan-ват се паралелно по ядра
+    with ProcessPoolExecutor() as ex:
+        for matches in ex.map(scan, list(iter_files(ROOT))):
+            keys.update(matches)
+
+    keys_sorted = sorted(keys)
 
-keys_sorted = sorted(keys)
+    os.makedirs(os.path.dirname(OUT), exist_ok=True)
+    with open(OUT, "w", encoding="utf-8") as f:
+        json.dump(keys_sorted, f, ensure_ascii=False, indent=2)
 
-os.makedirs(os.path.dirname(OUT), exist_ok=True)
-with open(OUT, "w", encoding="utf-8") as f:
-    json.dump(keys_sorted, f, ensure_ascii=False, indent=2)
+    print(f"Found {len(keys_sorted)} keys -> {OUT}")
 
-print(f"Found {len(keys_sorted)} keys -> {OUT}")
+if __name__ == "__main__":
+    main()